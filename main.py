@@ -1,100 +1,380 @@
+import asyncio
+import functools
+import gzip
+import json
 import os
+import re
 import time
 import logging
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Annotated, List
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, PlainTextResponse, JSONResponse
-from pydantic import BaseModel
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+from uuid import uuid4
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
+from pydantic import BaseModel, ConfigDict, StringConstraints
+
+# playwright is imported lazily inside the browser helpers: it adds a few
+# hundred ms and tens of MB RSS at import time, which /health-only
+# replicas and tests never need.
 
 # ───────────────────────── Logging / Config ─────────────────────────
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("main")
 
-app = FastAPI(title="Quartr Loader", version="3.2")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the shared browser before the first request so it doesn't pay
+    # the launch cost; tolerate replicas without browsers installed.
+    try:
+        await _get_browser()
+    except Exception as e:
+        logger.warning("Browser warm-up failed: %s", e)
+    yield
+    await _reset_browser()
+    global _pw
+    if _pw is not None:
+        try:
+            await _pw.stop()
+        except Exception:
+            pass
+        _pw = None
+
+app = FastAPI(
+    title="Quartr Loader",
+    version="3.2",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,  # /diag & debug endpoints get polled
+)
 
 QUARTR_EMAIL = os.getenv("QUARTR_EMAIL", "")
 QUARTR_PASSWORD = os.getenv("QUARTR_PASSWORD", "")
 
 # Playwright timeouts and a hard watchdog for /backfill
 PW_DEFAULT_TIMEOUT_MS = int(os.getenv("PW_DEFAULT_TIMEOUT_MS", "15000"))
+# Short default for selector probes; the long timeout above is reserved
+# for login navigation, where Keycloak redirects genuinely take a while.
+PW_PROBE_TIMEOUT_MS = int(os.getenv("PW_PROBE_TIMEOUT_MS", "3000"))
 BACKFILL_MAX_SECONDS = int(os.getenv("BACKFILL_MAX_SECONDS", "150"))
+# How many quarters are scraped concurrently (each on its own page)
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "3"))
 
 # Where debug artifacts live (served via endpoints below)
 TMP_DIR = "/tmp"
 
+# Persisted Keycloak cookies/localStorage; lets warm runs skip login
+STATE_PATH = os.getenv("QUARTR_STATE_PATH", "/tmp/quartr_state.json")
+
+# Server-scraper flag set: no GPU/extensions/background work we'd never
+# use headless; shaves cold start and steady-state CPU.
+CHROMIUM_ARGS = [
+    "--no-sandbox",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--no-first-run",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-ipc-flooding-protection",
+    "--disable-background-timer-throttling",
+    "--disable-breakpad",
+    "--disable-client-side-phishing-detection",
+    "--disable-hang-monitor",
+    "--disable-popup-blocking",
+    "--disable-prompt-on-repost",
+    # site isolation spawns a renderer per origin — wasteful for a
+    # single-site scraper; the heap cap keeps a leaky SPA tab bounded
+    "--disable-features=Translate,BackForwardCache,AcceptCHFrame,IsolateOrigins,site-per-process",
+    "--js-flags=--max-old-space-size=512",
+]
+
+# Chromium's compositor/raster tiles live in /dev/shm; pushing them to
+# disk (--disable-dev-shm-usage) slows navigation and screenshots, but
+# the default 64 MB container shm crashes tabs without it. Set
+# PW_LARGE_SHM=1 only when the runtime mounts a big shm
+# (docker --shm-size=1g or equivalent).
+if os.getenv("PW_LARGE_SHM", "0") != "1":
+    CHROMIUM_ARGS.append("--disable-dev-shm-usage")
+
+# Resource types the scraper never inspects; aborted via route
+# interception. Stylesheets stay enabled — :has-text visibility checks
+# depend on layout.
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+# Third-party analytics/telemetry the app loads but the scraper never needs.
+BLOCKED_HOST_FRAGMENTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "segment.io",
+    "segment.com",
+    "hotjar.com",
+    "intercom.io",
+    "sentry.io",
+    "doubleclick.net",
+)
+
+async def _block_heavy_resources(route):
+    req = route.request
+    if req.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    elif any(h in req.url for h in BLOCKED_HOST_FRAGMENTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# Set QUARTR_DEBUG_SNAP=1 to also capture artifacts on the success path;
+# by default we only snap on failures.
+DEBUG_SNAP = os.getenv("QUARTR_DEBUG_SNAP", "0") == "1"
+
 # Preferred company names when a ticker is ambiguous
 PREFERRED_COMPANY_BY_TICKER = {
     "PCOR": ["Procore"],  # extend as needed
 }
 
+# ticker → company page URL, filled in as searches succeed so repeat
+# backfills can navigate directly instead of re-running the search flow
+_company_url_cache: dict[str, str] = {}
+
+# Tickers are interpolated into CSS selectors; strip anything that could
+# break out of the quoted :has-text() argument.
+_TICKER_SAFE_RE = re.compile(r"[^A-Z0-9._-]")
+
+def _company_url_from_search_json(data, t: str):
+    """Best-effort walk of the search XHR payload: find a company whose
+    ticker matches and that carries an explicit URL/path field."""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            tick = str(node.get("ticker") or node.get("symbol") or "").upper()
+            if tick == t:
+                for k in ("url", "href", "path", "link"):
+                    v = node.get(k)
+                    if isinstance(v, str) and "/" in v:
+                        return v
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return None
+
+@functools.lru_cache(maxsize=256)
+def _company_click_selector(t: str, name_contains: str | None) -> str:
+    bases = ("[class*='card']", "[data-testid*='company']", "a", "button")
+    if name_contains:
+        return ", ".join(f"{b}:has-text('{name_contains}'):has-text('{t}')" for b in bases)
+    return ", ".join(f"{b}:has-text('{t}')" for b in bases)
+
+# Login-field selectors, comma-joined so Playwright resolves them in one
+# locator query instead of a count() round trip per candidate.
+EMAIL_SEL = ", ".join([
+    "#username", "input#username", "input#email",
+    "input[name='username']", "input[name='email']",
+    "input[type='email']", "input[autocomplete='username']",
+    "input[placeholder*='email' i]", "input[placeholder*='username' i]",
+    "input[aria-label*='email' i]", "input[aria-label*='username' i]",
+])
+PASSWORD_SEL = ", ".join([
+    "#password", "input#password", "input[name='password']",
+    "input[type='password']", "input[autocomplete='current-password']",
+    "input[placeholder*='password' i]", "input[aria-label*='password' i]",
+])
+SUBMIT_SEL = ", ".join([
+    "#kc-login", "button#kc-login", "button[name='login']",
+    "button[type='submit']", "input[type='submit']",
+])
+SUBMIT_NAME_RE = re.compile(r"next|continue|sign ?in|log ?in", re.I)
+SEARCH_BOX_SEL = ", ".join([
+    "input[type='search']",
+    "input[placeholder*='Search' i]",
+    "input[aria-label*='Search' i]",
+    "[role='combobox']",
+    "[contenteditable=''], [contenteditable='true'], [role='textbox']",
+])
+COOKIE_BUTTON_TEXTS = ["Accept", "Agree", "Allow all", "OK", "I agree", "Accept all cookies"]
+
+# Fills whichever login inputs exist in one evaluate (one CDP round-trip
+# instead of click+fill per field). Uses the native value setter so
+# React/controlled inputs see the change, then fires input/change.
+_LOGIN_FILL_JS = """([emailSel, pwSel, email, password]) => {
+  const set = (sel, value) => {
+    const el = document.querySelector(sel);
+    if (!el) return false;
+    const desc = Object.getOwnPropertyDescriptor(window.HTMLInputElement.prototype, 'value');
+    desc.set.call(el, value);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+    return true;
+  };
+  return { email: set(emailSel, email), password: set(pwSel, password) };
+}"""
+CONTINUE_EMAIL_NAMES = ["Continue with Email", "Continue", "Email"]
+
+# Asset link labels / attribute needles, keyed by the response field name
+ASSET_LINK_TEXTS = {
+    "press_release": ["Press release", "Press Release", "Release"],
+    "transcript": ["Transcript", "Call transcript"],
+    "slides": ["Slides", "Presentation", "Deck"],
+}
+# One case-insensitive name regex per asset type: a single role query
+# replaces one query per label spelling.
+ASSET_NAME_RES = {
+    key: re.compile("|".join(re.escape(t) for t in texts), re.I)
+    for key, texts in ASSET_LINK_TEXTS.items()
+}
+ASSET_NEEDLES = {
+    "press_release": ("press", "release", "pr"),
+    "transcript": ("transcript", "call"),
+    "slides": ("slides", "presentation", "deck"),
+}
+
 # ───────────────────────── Models ─────────────────────────
+# Constrained types run in pydantic-core (Rust): upper-casing and the
+# pattern check happen during validation, not in the scrape code.
+Ticker = Annotated[str, StringConstraints(pattern=r"^[A-Za-z0-9.\-]{1,10}$", to_upper=True)]
+Quarter = Annotated[str, StringConstraints(pattern=r"^[Qq][1-4]$", to_upper=True)]
+
 class BackfillRequest(BaseModel):
-    ticker: str
+    model_config = ConfigDict(frozen=True)
+
+    ticker: Ticker
     start_year: int
     end_year: int
-    start_q: str = "Q1"
-    end_q: str = "Q4"
+    start_q: Quarter = "Q1"
+    end_q: Quarter = "Q4"
 
 # ───────────────────────── Debug utils + endpoints ─────────────────────────
-def _save_png(page, tag: str) -> str:
-    fname = f"debug_{tag}_{int(time.time())}.png"
+# Most recent screenshot, tracked so /debug/latest is O(1)
+_latest_png = None
+
+# Cap captures per process: a ticker that fails every quarter would
+# otherwise screenshot dozens of times (each one serializes the
+# compositor) and fill /tmp. The first few failures tell the story.
+DEBUG_CAPTURE_CAP = int(os.getenv("QUARTR_DEBUG_CAP", "20"))
+_debug_captures = 0
+
+def _capture_budget_left() -> bool:
+    global _debug_captures
+    if _debug_captures >= DEBUG_CAPTURE_CAP:
+        return False
+    _debug_captures += 1
+    return True
+
+async def _save_png(page, tag: str) -> str:
+    global _latest_png
+    if not _capture_budget_left():
+        return ""
+    # monotonic ns: wall-clock seconds collide across parallel quarter
+    # workers failing in the same second
+    fname = f"debug_{tag}_{time.monotonic_ns()}.jpg"
     path = os.path.join(TMP_DIR, fname)
     try:
-        page.screenshot(path=path, full_page=True)
-        logger.error("Saved debug PNG: /debug/snap/%s", fname)
+        # Viewport-only JPEG: full-page PNG forces Chromium to paint the
+        # entire scrollable area and encodes 5-10x more bytes than a
+        # quality-60 JPEG, which is plenty for debugging.
+        await page.screenshot(path=path, full_page=False, type="jpeg", quality=60)
+        _latest_png = fname
+        logger.error("Saved debug snap: /debug/snap/%s", fname)
     except Exception as e:
-        logger.error("Failed to save PNG: %s", e)
+        logger.error("Failed to save snap: %s", e)
     return fname
 
-def _save_html(page, tag: str) -> str:
-    fname = f"debug_{tag}_{int(time.time())}.html"
-    path = os.path.join(TMP_DIR, fname)
+# Small pool so large debug writes don't block the event loop
+_io_pool = ThreadPoolExecutor(max_workers=2)
+
+def _write_html_gz(path: str, fname: str, content: str):
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(page.content())
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=1) as f:
+            f.write(content)
         logger.error("Saved debug HTML: /debug/html/%s", fname)
     except Exception as e:
         logger.error("Failed to save HTML: %s", e)
+
+# page.content() serializes the whole DOM over CDP — megabytes on the
+# SPA pages — so HTML dumps are opt-in (QUARTR_HTML_DUMP=1, debug-level
+# logging, or the snap-everything flag). Screenshots stay on by default.
+HTML_DUMP = os.getenv("QUARTR_HTML_DUMP", "0") == "1"
+
+async def _save_html(page, tag: str) -> str:
+    if not (HTML_DUMP or DEBUG_SNAP or logger.isEnabledFor(logging.DEBUG)):
+        return ""
+    if not _capture_budget_left():
+        return ""
+    fname = f"debug_{tag}_{time.monotonic_ns()}.html.gz"
+    path = os.path.join(TMP_DIR, fname)
+    try:
+        content = await page.content()
+        _io_pool.submit(_write_html_gz, path, fname, content)
+    except Exception as e:
+        logger.error("Failed to save HTML: %s", e)
     return fname
 
+@functools.lru_cache(maxsize=1)
+def _tmp_listing(dir_mtime: float) -> tuple:
+    # Keyed on the directory mtime so the cache invalidates as soon as a
+    # file is added/removed. scandir keeps the walk in C and skips the
+    # per-entry stat that listdir+filter patterns tend to grow.
+    with os.scandir(TMP_DIR) as it:
+        return tuple(sorted(e.name for e in it if e.name.startswith("debug_")))
+
+def _debug_files() -> list:
+    return list(_tmp_listing(os.stat(TMP_DIR).st_mtime))
+
 @app.get("/debug/list_tmp")
 def debug_list_tmp():
-    files = [f for f in os.listdir(TMP_DIR) if f.endswith(".png") or f.endswith(".html")]
-    files.sort()
+    files = [f for f in _debug_files() if f.endswith((".png", ".jpg", ".html", ".html.gz"))]
     return {"files": files}
 
+def _snap_media_type(fname: str) -> str:
+    return "image/jpeg" if fname.endswith(".jpg") else "image/png"
+
 @app.get("/debug/latest")
 def debug_latest():
-    files = [f for f in os.listdir(TMP_DIR) if f.endswith(".png")]
-    if not files:
+    if _latest_png and os.path.exists(os.path.join(TMP_DIR, _latest_png)):
+        return FileResponse(os.path.join(TMP_DIR, _latest_png), media_type=_snap_media_type(_latest_png))
+    # Fallback (e.g. after a restart): single-pass max, no sort
+    files = [f for f in _debug_files() if f.endswith((".png", ".jpg"))]
+    newest = max(
+        files,
+        key=lambda n: os.path.getmtime(os.path.join(TMP_DIR, n)),
+        default=None,
+    )
+    if newest is None:
         return JSONResponse({"error": "no screenshots yet"}, status_code=404)
-    files.sort(key=lambda n: os.path.getmtime(os.path.join(TMP_DIR, n)), reverse=True)
-    return FileResponse(os.path.join(TMP_DIR, files[0]), media_type="image/png")
+    return FileResponse(os.path.join(TMP_DIR, newest), media_type=_snap_media_type(newest))
 
 @app.get("/debug/snap/{fname}")
 def debug_snap(fname: str):
     path = os.path.join(TMP_DIR, os.path.basename(fname))
     if not os.path.exists(path):
         return JSONResponse({"error": "not found"}, status_code=404)
-    return FileResponse(path, media_type="image/png")
+    return FileResponse(path, media_type=_snap_media_type(path))
 
 @app.get("/debug/html/{fname}")
 def debug_html(fname: str):
     path = os.path.join(TMP_DIR, os.path.basename(fname))
     if not os.path.exists(path):
         return JSONResponse({"error": "not found"}, status_code=404)
-    with open(path, "r", encoding="utf-8") as f:
-        return PlainTextResponse(f.read(), media_type="text/html")
+    # Stream from disk (sendfile) instead of buffering the whole
+    # snapshot in a Python str; the browser inflates .gz itself.
+    headers = {"Cache-Control": "public, max-age=60"}
+    if path.endswith(".gz"):
+        headers["Content-Encoding"] = "gzip"
+    return FileResponse(path, media_type="text/html; charset=utf-8", headers=headers)
 
 # ───────────────────────── Health / Env ─────────────────────────
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True}
 
 @app.get("/envcheck")
-def envcheck():
+async def envcheck():
     return {
         "QUARTR_EMAIL": bool(QUARTR_EMAIL),
         "QUARTR_PASSWORD": bool(QUARTR_PASSWORD),
@@ -103,190 +383,243 @@ def envcheck():
     }
 
 @app.get("/diag")
-def diag():
-    count = len([f for f in os.listdir(TMP_DIR) if f.startswith("debug_")])
+async def diag():
+    count = sum(1 for f in _debug_files() if f.startswith("debug_"))
     return {"ok": True, "debug_files": count}
 
 # ───────────────────────── Login (robust, frames-aware) ─────────────────────────
-def login_keycloak(page, email: str, password: str):
+async def login_keycloak(page, email: str, password: str):
     page.set_default_timeout(PW_DEFAULT_TIMEOUT_MS)
 
-    def link_png(tag): return f"/debug/snap/{_save_png(page, tag)}"
-    def link_html(tag): return f"/debug/html/{_save_html(page, tag)}"
+    async def link_png(tag): return f"/debug/snap/{await _save_png(page, tag)}"
+    async def link_html(tag): return f"/debug/html/{await _save_html(page, tag)}"
 
     logger.info("LOGIN: navigate to app")
-    page.goto("https://web.quartr.com/", wait_until="domcontentloaded")
-    page.wait_for_load_state("networkidle")
+    # 'commit' returns on the first response headers — we only need to
+    # know which host the Keycloak redirect chain lands on, not wait for
+    # each intermediate hop to parse its document.
+    await page.goto("https://web.quartr.com/", wait_until="commit")
+    try:
+        await page.wait_for_url(re.compile(r"(web|auth)\.quartr\.com"), timeout=8000)
+    except Exception:
+        pass
+    # Either the app shell renders (authenticated) or Keycloak's form
+    # shows up; don't wait for the network to go fully idle.
+    try:
+        await page.wait_for_selector("main, #kc-login, #username, input[type='email']", timeout=8000)
+    except Exception:
+        pass
 
     # Already logged in?
     if "web.quartr.com" in page.url and "auth.quartr.com" not in page.url:
         logger.info("LOGIN: already authenticated")
         return
 
-    page.wait_for_timeout(600)  # allow SPA redirect
+    # Event-driven instead of a blind sleep: proceed as soon as the SPA
+    # redirect has rendered something interactive.
+    try:
+        await page.wait_for_selector("input, form, button", timeout=5000)
+    except Exception:
+        pass
 
-    def dismiss_cookies(doc):
+    async def dismiss_cookies(doc):
         try:
-            for txt in ["Accept", "Agree", "Allow all", "OK", "I agree", "Accept all cookies"]:
+            for txt in COOKIE_BUTTON_TEXTS:
                 btn = doc.get_by_role("button", name=txt, exact=False)
-                if btn and btn.count() and btn.first.is_visible():
-                    btn.first.click()
-                    doc.wait_for_timeout(150)
+                if btn and await btn.count() and await btn.first.is_visible():
+                    await btn.first.click()
+                    # banner dismissal is animated; wait for it to go, not a clock
+                    try:
+                        await btn.first.wait_for(state="hidden", timeout=1000)
+                    except Exception:
+                        pass
                     break
         except Exception:
             pass
 
-    def press_submit(doc) -> bool:
-        for sel in ["#kc-login", "button#kc-login", "button[name='login']", "button[type='submit']", "input[type='submit']"]:
-            loc = doc.locator(sel)
-            if loc and loc.count():
-                try:
-                    with doc.expect_navigation(wait_until="load", timeout=PW_DEFAULT_TIMEOUT_MS):
-                        loc.first.click()
-                except Exception:
-                    loc.first.click()
-                doc.wait_for_load_state("networkidle")
-                return True
-        for nm in ["Next", "Continue", "Continue with Email", "Sign in", "Sign In", "Log in", "Log In"]:
-            loc = doc.get_by_role("button", name=nm, exact=False)
-            if loc and loc.count():
+    async def press_submit(doc) -> bool:
+        # One compound CSS query plus one role query with a name regex —
+        # two probes total instead of one count() per candidate.
+        for loc in (doc.locator(SUBMIT_SEL), doc.get_by_role("button", name=SUBMIT_NAME_RE)):
+            if loc and await loc.count():
                 try:
-                    with doc.expect_navigation(wait_until="load", timeout=PW_DEFAULT_TIMEOUT_MS):
-                        loc.first.click()
+                    async with doc.expect_navigation(wait_until="load", timeout=PW_DEFAULT_TIMEOUT_MS):
+                        await loc.first.click()
                 except Exception:
-                    loc.first.click()
-                doc.wait_for_load_state("networkidle")
+                    await loc.first.click()
+                await doc.wait_for_load_state("domcontentloaded")
                 return True
         try:
-            doc.keyboard.press("Enter")
-            doc.wait_for_load_state("networkidle")
+            await doc.keyboard.press("Enter")
+            await doc.wait_for_load_state("domcontentloaded")
             return True
         except Exception:
             return False
 
-    def fill_text(doc, value, candidates) -> bool:
-        # CSS first
-        for sel in candidates:
-            loc = doc.locator(sel)
-            if loc and loc.count():
-                for i in range(min(loc.count(), 5)):
-                    el = loc.nth(i)
-                    if el.is_visible():
-                        try:
-                            el.click()
-                            el.fill(value)
-                            return True
-                        except Exception:
-                            continue
-        # label/placeholder fallbacks
-        if value == email:
-            fallbacks = [
-                doc.get_by_label("Email", exact=False),
-                doc.get_by_label("Username", exact=False),
-                doc.get_by_placeholder("Email"),
-                doc.get_by_placeholder("Username"),
-                doc.get_by_role("textbox", name="Email", exact=False),
-            ]
-        else:
-            fallbacks = [
-                doc.get_by_label("Password", exact=False),
-                doc.get_by_placeholder("Password"),
-                doc.get_by_role("textbox", name="Password", exact=False),
-            ]
-        for loc in fallbacks:
-            if loc and loc.count():
-                vis = loc.first
-                if vis.is_visible():
-                    try:
-                        vis.click(); vis.fill(value)
-                        return True
-                    except Exception:
-                        continue
+    async def fill_text(doc, value, selector) -> bool:
+        loc = doc.locator(selector)
+        # Fast path: let the engine find the first visible match in one
+        # query instead of probing candidates with is_visible() each.
+        # ("visible=true" selector engine — Locator.filter(visible=...)
+        # needs a newer playwright than the 1.46 pin.)
+        try:
+            el = loc.locator("visible=true").first
+            await el.wait_for(state="visible", timeout=1000)
+            await el.click()
+            await el.fill(value)
+            return True
+        except Exception:
+            pass
+        # Rare: the first visible match refuses input (readonly/overlay);
+        # walk the first few candidates the old way.
+        try:
+            n = await loc.count()
+        except Exception:
+            return False
+        for i in range(min(n, 5)):
+            el = loc.nth(i)
+            try:
+                if await el.is_visible():
+                    await el.click()
+                    await el.fill(value)
+                    return True
+            except Exception:
+                continue
         return False
 
-    def maybe_continue_email(doc):
-        for nm in ["Continue with Email", "Continue", "Email"]:
+    async def maybe_continue_email(doc):
+        for nm in CONTINUE_EMAIL_NAMES:
             try:
                 b = doc.get_by_role("button", name=nm, exact=False)
-                if b and b.count() and b.first.is_visible():
-                    b.first.click()
-                    doc.wait_for_timeout(250)
+                if b and await b.count() and await b.first.is_visible():
+                    await b.first.click()
+                    # the email step replaces the button with the form
+                    try:
+                        await doc.locator(EMAIL_SEL).first.wait_for(state="visible", timeout=1500)
+                    except Exception:
+                        pass
                     return
             except Exception:
                 continue
 
-    def attempt(doc) -> bool:
+    async def attempt(doc) -> bool:
         try:
-            doc.wait_for_selector("input,button,form", timeout=PW_DEFAULT_TIMEOUT_MS)
+            await doc.wait_for_selector("input,button,form", timeout=PW_DEFAULT_TIMEOUT_MS)
         except Exception:
             return False
 
-        dismiss_cookies(doc)
-        maybe_continue_email(doc)
-
-        email_candidates = [
-            "#username", "input#username", "input#email",
-            "input[name='username']", "input[name='email']",
-            "input[type='email']", "input[autocomplete='username']",
-            "input[placeholder*='email' i]", "input[placeholder*='username' i]",
-        ]
-        if fill_text(doc, email, email_candidates):
-            press_submit(doc)
+        await dismiss_cookies(doc)
+        await maybe_continue_email(doc)
+
+        # Fast path: set both fields in one evaluate; fall back to the
+        # locator-based fill per field if the JS route misses.
+        async def js_fill():
+            try:
+                return await doc.evaluate(_LOGIN_FILL_JS, [EMAIL_SEL, PASSWORD_SEL, email, password])
+            except Exception:
+                return {"email": False, "password": False}
+
+        filled = await js_fill()
+        if filled["email"] or await fill_text(doc, email, EMAIL_SEL):
+            await press_submit(doc)
             if "web.quartr.com" in page.url and "auth.quartr.com" not in page.url:
                 return True
 
-        doc.wait_for_timeout(400)
-        pw_candidates = [
-            "#password", "input#password", "input[name='password']",
-            "input[type='password']", "input[autocomplete='current-password']",
-            "input[placeholder*='password' i]",
-        ]
-        if fill_text(doc, password, pw_candidates):
-            press_submit(doc)
+        # Wait for the password step to render rather than sleeping
+        try:
+            await doc.locator(PASSWORD_SEL).first.wait_for(state="visible", timeout=5000)
+        except Exception:
+            pass
+        if not filled["password"]:
+            filled = await js_fill()  # password field may have just rendered
+        if filled["password"] or await fill_text(doc, password, PASSWORD_SEL):
+            await press_submit(doc)
             if "web.quartr.com" in page.url and "auth.quartr.com" not in page.url:
                 return True
 
         return "web.quartr.com" in page.url and "auth.quartr.com" not in page.url
 
-    if attempt(page):
+    if await attempt(page):
         return
 
+    # Only walk iframes when the main document plausibly lacks the form
+    # (some Keycloak themes embed it); Quartr's usual theme renders it
+    # top-level, so this loop is skipped on the common path.
     frame_urls = []
-    for fr in page.frames:
-        frame_urls.append(fr.url)
-        try:
-            if attempt(fr):
-                return
-        except Exception:
-            continue
+    has_form = False
+    try:
+        has_form = await page.evaluate(
+            "() => !!document.querySelector(\"input[type='password'], input[type='email'], #username\")"
+        )
+    except Exception:
+        pass
+    if not has_form and len(page.frames) > 1:
+        for fr in page.frames:
+            frame_urls.append(fr.url)
+            try:
+                if await attempt(fr):
+                    return
+            except Exception:
+                continue
 
-    png = link_png("login_fail")
-    html = link_html("login_fail")
+    png = await link_png("login_fail")
+    html = await link_html("login_fail")
     raise RuntimeError(f"Keycloak login failed. URL: {page.url} | Frames: {frame_urls} | PNG: {png} | HTML: {html}")
 
 # ───────────────────────── Company search (palette, contenteditable, preferences) ─────────────────────────
-def open_company(page, ticker: str):
+async def open_company(page, ticker: str) -> str:
     """
     Opens the company page from the 'Companies' results.
     Prefers mapped names (e.g., PCOR → Procore). Falls back to first company card.
-    Saves PNG/HTML at key steps.
+    Returns the company page URL so callers can re-navigate without re-searching.
     """
-    page.set_default_timeout(PW_DEFAULT_TIMEOUT_MS)
-    t = ticker.upper()
+    # Ticker arrives upper-cased from the request model; strip anything
+    # that could break selector interpolation rather than re-normalizing.
+    t = _TICKER_SAFE_RE.sub("", ticker)
     preferred_names = PREFERRED_COMPANY_BY_TICKER.get(t, ["Procore"] if t == "PCOR" else [])
 
-    def snap(tag):
-        _save_png(page, tag); _save_html(page, tag)
+    async def snap(tag):
+        if DEBUG_SNAP:
+            await _save_png(page, tag)
+            await _save_html(page, tag)
+
+    def remember(url: str) -> str:
+        _company_url_cache[t] = url
+        return url
+
+    async def landed_on_company() -> bool:
+        # An SPA click can leave page.url on /search for a beat — or for
+        # good, if the click hit the wrong element. Only URLs that
+        # actually reach a company page may be returned/cached; quarter
+        # workers re-goto this URL blind.
+        try:
+            await page.wait_for_url("**/company/**", timeout=3000)
+            return True
+        except Exception:
+            return False
+
+    # 0) Cached hit from an earlier backfill — skip the search entirely.
+    cached = _company_url_cache.get(t)
+    if cached:
+        try:
+            await page.goto(cached, wait_until="domcontentloaded")
+            if "/company/" in page.url:
+                return page.url
+        except Exception:
+            pass
+        _company_url_cache.pop(t, None)  # stale — fall through to search
 
     # 1) Home → open palette ('/' then Enter) → type ticker
-    page.goto("https://web.quartr.com/home", wait_until="domcontentloaded")
-    page.wait_for_load_state("networkidle")
-    page.wait_for_timeout(150)
+    await page.goto("https://web.quartr.com/home", wait_until="domcontentloaded")
+    try:
+        await page.locator("input, [role='textbox'], [contenteditable]").first.wait_for(timeout=5000)
+    except Exception:
+        pass
 
     # try to focus the palette
-    def focused_is_textual():
+    async def focused_is_textual():
         try:
-            return page.evaluate("""() => {
+            return await page.evaluate("""() => {
               const a = document.activeElement;
               if (!a) return {ok:false};
               const tag = a.tagName?.toLowerCase();
@@ -297,45 +630,85 @@ def open_company(page, ticker: str):
         except Exception:
             return {"ok": False}
 
+    # after '/' (or a click), poll for a textual active element instead
+    # of sleeping a fixed beat — returns as soon as focus actually moves
+    _FOCUS_TEXTUAL_JS = """() => {
+      const a = document.activeElement;
+      if (!a) return false;
+      const tag = a.tagName?.toLowerCase();
+      const editable = a.getAttribute && a.getAttribute('contenteditable');
+      const role = a.getAttribute && a.getAttribute('role');
+      return !!(tag==='input' || editable==='' || editable==='true' || role==='textbox');
+    }"""
+
+    async def wait_focus():
+        try:
+            await page.wait_for_function(_FOCUS_TEXTUAL_JS, timeout=500)
+        except Exception:
+            pass
+
     try:
-        page.keyboard.press("/")
-        page.wait_for_timeout(100)
+        await page.keyboard.press("/")
+        await wait_focus()
     except Exception:
         pass
 
-    if not focused_is_textual().get("ok"):
-        # click likely inputs
-        for sb in [
-            page.get_by_placeholder("Search"),
-            page.get_by_role("combobox", name="Search", exact=False),
-            page.locator("input[type='search']"),
-            page.locator("[contenteditable=''], [contenteditable='true'], [role='textbox']"),
-            page.locator("input[placeholder*='Search' i]"),
-            page.locator("input[aria-label*='Search' i]"),
-        ]:
-            if sb and sb.count():
-                try:
-                    sb.first.click(); page.wait_for_timeout(80); break
-                except Exception:
-                    continue
+    if not (await focused_is_textual()).get("ok"):
+        # click the first likely input — one compound query, one click
+        try:
+            await page.locator(SEARCH_BOX_SEL).first.click(timeout=2000)
+            await wait_focus()
+        except Exception:
+            pass
 
     # clear → type → Enter
     try:
-        page.keyboard.down("Control"); page.keyboard.press("KeyA"); page.keyboard.up("Control")
-        page.keyboard.press("Backspace")
+        await page.keyboard.down("Control")
+        await page.keyboard.press("KeyA")
+        await page.keyboard.up("Control")
+        await page.keyboard.press("Backspace")
     except Exception:
         pass
-    page.keyboard.type(t, delay=20)
-    page.keyboard.press("Enter")
-    page.wait_for_load_state("networkidle")
-    page.wait_for_timeout(300)
-    snap(f"open_company_after_enter_{t}")
+    # Fast path: capture the SPA's search XHR while we type and read the
+    # result JSON directly — no re-render wait, no DOM scraping.
+    search_resp = None
+    try:
+        async with page.expect_response(
+            lambda r: "search" in r.url and r.status == 200, timeout=4000
+        ) as resp_info:
+            await page.keyboard.type(t, delay=20)
+            await page.keyboard.press("Enter")
+        search_resp = await resp_info.value
+    except Exception:
+        pass
+
+    if search_resp is not None:
+        try:
+            url = _company_url_from_search_json(await search_resp.json(), t)
+            if url:
+                if not url.startswith("http"):
+                    url = f"https://web.quartr.com{url}"
+                await page.goto(url, wait_until="domcontentloaded")
+                if await landed_on_company():
+                    await snap(f"open_company_via_xhr_{t}")
+                    return remember(page.url)
+        except Exception:
+            pass
+
+    await page.wait_for_load_state("domcontentloaded")
+    try:
+        await page.wait_for_url("**/search**", timeout=3000)
+    except Exception:
+        pass
+    await snap(f"open_company_after_enter_{t}")
 
     # 2) Ensure we're on /search page (matches your screenshot layout)
     if "/search" not in page.url:
-        page.goto(f"https://web.quartr.com/search?q={t}", wait_until="domcontentloaded")
-        page.wait_for_load_state("networkidle")
-        page.wait_for_timeout(200)
+        await page.goto(f"https://web.quartr.com/search?q={t}", wait_until="domcontentloaded")
+        try:
+            await page.locator("main section").first.wait_for(timeout=3000)
+        except Exception:
+            pass
 
     # 3) Locate 'Companies' section container
     companies = None
@@ -347,297 +720,471 @@ def open_company(page, ticker: str):
     ]:
         try:
             loc = page.locator(sel)
-            if loc and loc.count():
+            if loc and await loc.count():
                 companies = loc.first
                 break
         except Exception:
             continue
     if not companies:
-        snap(f"no_companies_section_{t}")
+        await snap(f"no_companies_section_{t}")
         companies = page  # fallback to entire page
 
-    # 4) Click helpers
-    def click_match(ctx, name_contains: str | None = None) -> bool:
-        cands = []
-        if name_contains:
-            cands += [
-                ctx.locator(f"[class*='card']:has-text('{name_contains}'):has-text('{t}')"),
-                ctx.locator(f"a:has-text('{name_contains}'):has-text('{t}')"),
-                ctx.locator(f"button:has-text('{name_contains}'):has-text('{t}')"),
-                ctx.get_by_role("link", name=name_contains, exact=False).filter(has_text=t),
-                ctx.get_by_role("button", name=name_contains, exact=False).filter(has_text=t),
-            ]
-        else:
-            cands += [
-                ctx.locator(f"[class*='card']:has-text('{t}')"),
-                ctx.get_by_role("link", name=t, exact=False),
-                ctx.get_by_role("button", name=t, exact=False),
-                ctx.locator(f"a:has-text('{t}')"),
-                ctx.locator(f"button:has-text('{t}')"),
-                ctx.locator(f"text=/\\b{t}\\b/"),
-            ]
-        for loc in cands:
+    # 4) Click helpers — one compound locator per strategy so Playwright
+    # resolves every candidate in a single query instead of a count()
+    # round-trip per selector.
+    async def click_match(ctx, name_contains: str | None = None) -> bool:
+        sel = _company_click_selector(t, name_contains)
+        try:
+            el = ctx.locator(sel).first
+            await el.wait_for(state="visible", timeout=2000)
+            await el.scroll_into_view_if_needed(timeout=800)
             try:
-                if loc and loc.count():
-                    el = loc.first
-                    el.scroll_into_view_if_needed(timeout=800)
-                    try:
-                        el.click()
-                    except Exception:
-                        el.locator("xpath=ancestor-or-self::*[self::a or self::button][1]").first.click()
-                    page.wait_for_load_state("networkidle")
-                    snap(f"clicked_{(name_contains or 'ticker').replace(' ', '_')}_{t}")
+                await el.click()
+            except Exception:
+                await el.locator("xpath=ancestor-or-self::*[self::a or self::button][1]").first.click()
+            await page.wait_for_load_state("domcontentloaded")
+            await snap(f"clicked_{(name_contains or 'ticker').replace(' ', '_')}_{t}")
+            return True
+        except Exception:
+            pass
+        # Last resort: one DOM pass in the page instead of a text=...
+        # engine query, which serializes every text node per probe.
+        if name_contains is None and ctx is page:
+            try:
+                sel = await page.evaluate(
+                    """(t) => {
+                      const el = [...document.querySelectorAll('a,button')]
+                        .find(e => e.textContent.includes(t));
+                      return el && el.id ? '#' + el.id : null;
+                    }""",
+                    t,
+                )
+                if sel:
+                    await page.locator(sel).first.click()
+                    await page.wait_for_load_state("domcontentloaded")
+                    await snap(f"clicked_ticker_{t}")
                     return True
             except Exception:
-                continue
+                pass
         return False
 
-    # Priority order:
+    # Priority order; every hit must prove it navigated to a company
+    # page before its URL is returned, else the next strategy runs.
     # a) Preferred name inside Companies
     for nm in preferred_names:
-        if click_match(companies, nm):
-            return
+        if await click_match(companies, nm) and await landed_on_company():
+            return remember(page.url)
     # b) Any ticker match inside Companies
-    if click_match(companies, None):
-        return
+    if await click_match(companies, None) and await landed_on_company():
+        return remember(page.url)
     # c) Preferred name anywhere on page
     for nm in preferred_names:
-        if click_match(page, nm):
-            return
+        if await click_match(page, nm) and await landed_on_company():
+            return remember(page.url)
     # d) Ticker anywhere on page
-    if click_match(page, None):
-        return
+    if await click_match(page, None) and await landed_on_company():
+        return remember(page.url)
 
     # e) Final fallback: first company card in Companies section
     try:
         first_card = companies.locator("[class*='card'], [data-testid*='company'], a:has([alt])").first
-        if first_card and first_card.is_visible():
-            first_card.scroll_into_view_if_needed(timeout=800)
+        if first_card and await first_card.is_visible():
+            await first_card.scroll_into_view_if_needed(timeout=800)
             try:
-                first_card.click()
+                await first_card.click()
             except Exception:
-                first_card.locator("xpath=ancestor-or-self::*[self::a or self::button][1]").first.click()
-            page.wait_for_load_state("networkidle")
-            snap(f"clicked_first_card_{t}")
-            return
+                await first_card.locator("xpath=ancestor-or-self::*[self::a or self::button][1]").first.click()
+            await page.wait_for_load_state("domcontentloaded")
+            if await landed_on_company():
+                await snap(f"clicked_first_card_{t}")
+                return remember(page.url)
     except Exception:
         pass
 
     # Hard fail with artifacts
-    png = _save_png(page, f"open_company_fail_{t}")
-    html = _save_html(page, f"open_company_fail_{t}")
+    png = await _save_png(page, f"open_company_fail_{t}")
+    html = await _save_html(page, f"open_company_fail_{t}")
     raise RuntimeError(f"Could not open company for {t}. PNG: /debug/snap/{png} HTML: /debug/html/{html}")
 
 # ───────────────────────── Open quarter + Assets ─────────────────────────
-def open_quarter(page, year: int, quarter: str) -> bool:
-    page.set_default_timeout(PW_DEFAULT_TIMEOUT_MS)
+@functools.lru_cache(maxsize=256)
+def _quarter_label_re(year: int, quarter: str) -> "re.Pattern":
     labels = [f"{quarter} {year}", f"{quarter} FY{year}", f"{quarter} {str(year)[-2:]}"]
-    for lb in labels:
-        loc = page.get_by_text(lb, exact=False)
-        if loc and loc.count():
-            try:
-                loc.first.click()
-                page.wait_for_load_state("networkidle")
-                page.wait_for_timeout(250)
-                _save_png(page, f"open_quarter_{year}_{quarter}")
-                return True
-            except Exception:
-                continue
+    return re.compile("|".join(re.escape(lb) for lb in labels))
+
+async def open_quarter(page, year: int, quarter: str) -> bool:
+    # One regex text query covers all label spellings in a single pass.
+    loc = page.get_by_text(_quarter_label_re(year, quarter))
+    if loc and await loc.count():
+        try:
+            await loc.first.click()
+            await page.wait_for_load_state("domcontentloaded")
+            return True
+        except Exception:
+            pass
     return False
 
-def _ensure_year_visible(page, year: int):
+async def _ensure_year_visible(page, year: int):
     """
     Tries to set the 'Earlier events' year dropdown to the requested year.
     If not found, we proceed (cards usually include the year anyway).
     """
-    page.set_default_timeout(PW_DEFAULT_TIMEOUT_MS)
     # Try a generic dropdown near 'Earlier events'
     try:
         sec = page.locator("section:has-text('Earlier events'), div:has(> h2:has-text('Earlier events'))").first
-        if sec and sec.count():
+        if sec and await sec.count():
             # Look for a button with the current year text
             ybtn = sec.get_by_role("button", name=str(year), exact=False)
-            if ybtn.count():
-                ybtn.first.click()
-                page.wait_for_timeout(150)
+            if await ybtn.count():
+                await ybtn.first.click()
+                # wait for the menu itself rather than a fixed delay
                 opt = page.get_by_role("menuitem", name=str(year), exact=True)
-                if opt.count():
-                    opt.first.click()
-                    page.wait_for_timeout(150)
-                    return
+                await opt.first.wait_for(state="visible", timeout=1500)
+                await opt.first.click()
+                await opt.first.wait_for(state="hidden", timeout=1500)
+                return
     except Exception:
         pass
     # Fallback: do nothing
 
-def _open_event_card(page, year: int, quarter: str) -> bool:
+async def _open_event_card(page, year: int, quarter: str) -> bool:
     """
     Clicks the event card like 'Q1 2025' inside the 'Earlier events' section.
     """
-    page.set_default_timeout(PW_DEFAULT_TIMEOUT_MS)
 
     # Ensure 'Earlier events' on-screen
     for sec_sel in ["section:has-text('Earlier events')", "div:has(> h2:has-text('Earlier events'))", "text=Earlier events"]:
         sec = page.locator(sec_sel)
-        if sec.count():
+        if await sec.count():
             try:
-                sec.first.scroll_into_view_if_needed(timeout=800)
+                await sec.first.scroll_into_view_if_needed(timeout=800)
                 break
             except Exception:
                 pass
 
-    label_variants = [f"{quarter} {year}", f"{quarter.upper()} {year}", f"{quarter.capitalize()} {year}"]
-    for lb in label_variants:
-        for card_sel in [
-            f"[class*='card']:has-text('{lb}')",
-            f"article:has-text('{lb}')",
-            f"div:has-text('{lb}')",
-            f"button:has-text('{lb}')",
-            f"a:has-text('{lb}')",
-        ]:
-            loc = page.locator(card_sel)
-            if loc.count():
-                try:
-                    el = loc.first
-                    el.scroll_into_view_if_needed(timeout=800)
-                    try:
-                        el.click()
-                    except Exception:
-                        el.locator("xpath=ancestor-or-self::*[self::a or self::button][1]").first.click()
-                    page.wait_for_load_state("networkidle")
-                    _save_png(page, f"opened_event_{year}_{quarter}")
-                    return True
-                except Exception:
-                    continue
-    _save_png(page, f"open_event_fail_{year}_{quarter}")
+    # Dedupe case variants ('Q1' upper/capitalize collapse to the same
+    # string) and resolve the label × element matrix with compound
+    # selectors instead of up to 15 sequential count() probes. Card-like
+    # elements are queried first and bare divs only as a fallback:
+    # :has-text() matches every ancestor of the text, so a div union
+    # member would resolve to the outermost page wrapper in document
+    # order and steal the click from the actual event card.
+    label_variants = list(dict.fromkeys(
+        [f"{quarter} {year}", f"{quarter.upper()} {year}", f"{quarter.capitalize()} {year}"]
+    ))
+    selector_tiers = [
+        ["[class*='card']", "article", "button", "a"],
+        ["div"],
+    ]
+    for bases in selector_tiers:
+        sel = ", ".join(
+            f"{base}:has-text('{lb}')" for lb in label_variants for base in bases
+        )
+        loc = page.locator(sel)
+        if not await loc.count():
+            continue
+        try:
+            el = loc.first
+            await el.scroll_into_view_if_needed(timeout=800)
+            try:
+                await el.click()
+            except Exception:
+                await el.locator("xpath=ancestor-or-self::*[self::a or self::button][1]").first.click()
+            await page.wait_for_load_state("domcontentloaded")
+            if DEBUG_SNAP:
+                await _save_png(page, f"opened_event_{year}_{quarter}")
+            return True
+        except Exception:
+            continue
+    await _save_png(page, f"open_event_fail_{year}_{quarter}")
     return False
 
-def _collect_asset_links_from_event(page) -> dict:
+async def _collect_asset_links_from_event(page) -> dict:
     """
     On an opened event row, collect Press release / Transcript / Slides URLs.
     Returns dict: { 'press_release': url_or_None, 'transcript': url_or_None, 'slides': url_or_None }.
     """
-    page.set_default_timeout(PW_DEFAULT_TIMEOUT_MS)
     assets = {"press_release": None, "transcript": None, "slides": None}
 
-    text_candidates = {
-        "press_release": ["Press release", "Press Release", "Release"],
-        "transcript": ["Transcript", "Call transcript"],
-        "slides": ["Slides", "Presentation", "Deck"]
-    }
-    for key, texts in text_candidates.items():
-        for txt in texts:
-            try:
-                a = page.get_by_role("link", name=txt, exact=False)
-                if a.count():
-                    href = a.first.get_attribute("href")
-                    if href:
-                        assets[key] = href
-                        break
-            except Exception:
-                continue
+    for key, name_re in ASSET_NAME_RES.items():
+        try:
+            a = page.get_by_role("link", name=name_re)
+            if await a.count():
+                href = await a.first.get_attribute("href")
+                if href:
+                    assets[key] = href
+        except Exception:
+            continue
 
     if not all(assets.values()):
         buttons = page.locator("a, button, [role='button']")
-        count = min(buttons.count(), 80)
+        count = min(await buttons.count(), 80)
         for i in range(count):
             try:
                 el = buttons.nth(i)
-                title = (el.get_attribute("title") or "").lower()
-                aria = (el.get_attribute("aria-label") or "").lower()
-                text = (el.inner_text() or "").lower()
-                target = (title + " " + aria + " " + text)
+                title = (await el.get_attribute("title") or "").lower()
+                aria = (await el.get_attribute("aria-label") or "").lower()
+                text = (await el.inner_text() or "").lower()
+                target = f"{title} {aria} {text}"
 
-                def set_if(key, *needles):
-                    nonlocal assets
+                for key, needles in ASSET_NEEDLES.items():
                     if assets[key] is None and any(n in target for n in needles):
-                        href = el.get_attribute("href")
+                        href = await el.get_attribute("href")
                         if href:
                             assets[key] = href
-
-                set_if("press_release", "press", "release", "pr")
-                set_if("transcript", "transcript", "call")
-                set_if("slides", "slides", "presentation", "deck")
-
             except Exception:
                 continue
 
-    _save_html(page, "event_assets_html")
-    _save_png(page, "event_assets_png")
+    if DEBUG_SNAP:
+        await _save_html(page, "event_assets_html")
+        await _save_png(page, "event_assets_png")
     return assets
 
-# ───────────────────────── Backfill route (with watchdog) ─────────────────────────
+# ───────────────────────── Warm shared browser ─────────────────────────
+# One async Playwright driver and one Chromium instance per worker
+# process, shared by every /backfill on the event loop. POOL_SIZE bounds
+# how many scrapes run concurrently against it.
+POOL_SIZE = int(os.getenv("POOL_SIZE", "1"))
+
+# Contexts older than this are recycled — Keycloak cookies expire
+CONTEXT_TTL_SECONDS = int(os.getenv("CONTEXT_TTL_SECONDS", "1800"))
+
+_pw = None
+_browser = None
+_browser_lock = asyncio.Lock()
+_backfill_sem = asyncio.Semaphore(POOL_SIZE)
+# Single-flight login: concurrent backfills wait for one Keycloak dance
+# instead of racing through the form in parallel.
+_login_lock = asyncio.Lock()
+
+_context = None
+_context_born = 0.0
+_context_lock = asyncio.Lock()
+# In-flight jobs holding pages on the shared context; the TTL recycle
+# must wait for this to hit zero or it destroys their pages mid-scrape
+# (matters whenever POOL_SIZE > 1).
+_context_leases = 0
+
+async def _get_browser():
+    global _pw, _browser
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            from playwright.async_api import async_playwright
+            if _pw is None:
+                _pw = await async_playwright().start()
+            logger.info("Launching Chromium")
+            _browser = await _pw.chromium.launch(
+                headless=True,
+                args=CHROMIUM_ARGS,
+                chromium_sandbox=False,
+                handle_sigint=False,
+            )
+        return _browser
+
+async def _get_context():
+    """Warm, logged-in context shared across requests; pages come and go,
+    the context (cookies, SPA caches) stays until its TTL lapses. Callers
+    must pair this with _release_context() when their pages are closed."""
+    global _context, _context_born, _context_leases
+    browser = await _get_browser()
+    async with _context_lock:
+        if (
+            _context is not None
+            and _context_leases == 0  # recycle only when idle
+            and time.monotonic() - _context_born > CONTEXT_TTL_SECONDS
+        ):
+            try:
+                await _context.close()
+            except Exception:
+                pass
+            _context = None
+        if _context is None:
+            _context = await browser.new_context(
+                storage_state=STATE_PATH if os.path.exists(STATE_PATH) else None,
+                viewport={"width": 1280, "height": 800},
+                # a registered SW would bypass our route handler and
+                # re-fetch the assets we block
+                service_workers="block",
+            )
+            await _context.route("**/*", _block_heavy_resources)
+            _context.set_default_timeout(PW_PROBE_TIMEOUT_MS)
+            _context_born = time.monotonic()
+        _context_leases += 1
+        return _context
+
+async def _release_context():
+    global _context_leases
+    async with _context_lock:
+        _context_leases = max(0, _context_leases - 1)
+
+async def _reset_browser():
+    global _browser, _context, _context_leases
+    browser, _browser = _browser, None
+    _context = None  # dies with the browser
+    _context_leases = 0
+    try:
+        if browser:
+            await browser.close()
+    except Exception:
+        pass
+
+# ───────────────────────── Backfill routes (async jobs) ─────────────────────────
+# A scrape takes tens of seconds; holding the request socket open for it
+# starves short endpoints. POST schedules the job and returns a job id
+# immediately; GET polls status/result. Job records are one JSON file
+# each under JOBS_DIR: with gunicorn running several workers the status
+# GET routinely lands on a different process than the POST, so the store
+# must be shared — /tmp is, process memory is not. Writes go through the
+# same tmp-file + os.replace dance as STATE_PATH so readers never see a
+# half-written record. A restart forgets jobs, which is fine for a scraper.
+JOBS_DIR = os.getenv("QUARTR_JOBS_DIR", "/tmp/quartr_jobs")
+_JOBS_MAX = 200
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def _job_write(job_id: str, data: dict):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    tmp = f"{_job_path(job_id)}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, _job_path(job_id))
+
+def _job_read(job_id: str):
+    try:
+        with open(_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _job_update(job_id: str, **fields):
+    data = _job_read(job_id) or {}
+    data.update(fields)
+    _job_write(job_id, data)
+
+def _jobs_prune():
+    # bounded history: drop the oldest records past the cap
+    try:
+        with os.scandir(JOBS_DIR) as it:
+            entries = sorted(
+                (e.stat().st_mtime, e.path) for e in it if e.name.endswith(".json")
+            )
+        for _, path in entries[: max(0, len(entries) - _JOBS_MAX)]:
+            os.unlink(path)
+    except OSError:
+        pass
+
+def _job_new(req: BackfillRequest) -> str:
+    job_id = uuid4().hex
+    _job_write(job_id, {"status": "queued", "ticker": req.ticker})
+    _jobs_prune()
+    return job_id
+
+async def _run_job(job_id: str, req: BackfillRequest):
+    _job_update(job_id, status="running")
+    try:
+        async with _backfill_sem:
+            # wait_for cancels the whole scrape at the deadline — every
+            # await inside is a cancellation point.
+            result = await asyncio.wait_for(_run_backfill(req), timeout=BACKFILL_MAX_SECONDS)
+        _job_update(job_id, status="done", result=result)
+    except asyncio.TimeoutError:
+        _job_update(job_id, status="error", detail=f"Backfill exceeded {BACKFILL_MAX_SECONDS}s")
+    except HTTPException as e:
+        _job_update(job_id, status="error", detail=e.detail)
+    except Exception as e:
+        logger.exception("Backfill job %s failed", job_id)
+        _job_update(job_id, status="error", detail=str(e))
+
 @app.post("/backfill")
-def backfill(req: BackfillRequest):
+async def backfill(req: BackfillRequest, background: BackgroundTasks):
     if not QUARTR_EMAIL or not QUARTR_PASSWORD:
         raise HTTPException(status_code=500, detail="Missing QUARTR_EMAIL or QUARTR_PASSWORD")
+    job_id = _job_new(req)
+    background.add_task(_run_job, job_id, req)
+    return {"job_id": job_id, "status": "queued", "status_url": f"/backfill/{job_id}"}
+
+@app.get("/backfill/{job_id}")
+async def backfill_status(job_id: str):
+    job = _job_read(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
+async def _run_backfill(req: BackfillRequest):
+    from playwright.async_api import TimeoutError as PWTimeoutError
 
     def qn(q: str) -> int:
         return int(q.replace("Q", ""))
 
-    start = time.monotonic()
-
-    def watchdog(step: str, page=None):
-        elapsed = time.monotonic() - start
-        if elapsed > BACKFILL_MAX_SECONDS:
+    page = None
+    context = None
+    try:
+        # Pages are ~10ms to open; the warm context keeps cookies, HTTP
+        # cache and SPA assets across requests so only the first run in
+        # a context's lifetime pays for login.
+        context = await _get_context()  # leased; released in finally
+        page = await context.new_page()
+
+        logger.info("STEP 1: login")
+        async with _login_lock:
+            await login_keycloak(page, QUARTR_EMAIL, QUARTR_PASSWORD)
+            page.set_default_timeout(PW_PROBE_TIMEOUT_MS)  # login raised it
             try:
-                if page: _save_png(page, f"watchdog_{int(elapsed)}s_at_{step.replace(' ', '_')}")
-            except Exception:
-                pass
-            raise HTTPException(status_code=504, detail=f"Backfill exceeded {BACKFILL_MAX_SECONDS}s at step: {step}")
+                # Refresh the cached session so the next run short-circuits
+                # the whole Keycloak flow. Written atomically: under
+                # multi-worker serving every worker shares STATE_PATH, and
+                # os.replace keeps readers from seeing a half-written file.
+                state = await context.storage_state()
+                tmp = f"{STATE_PATH}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp, STATE_PATH)
+            except Exception as e:
+                logger.warning("Could not persist storage state: %s", e)
+
+        logger.info("STEP 2: open company")
+        ticker = req.ticker  # upper-cased by the model; bind once for the workers
+        company_url = await open_company(page, ticker)
+
+        logger.info("STEP 3: scrape quarters concurrently")
+        start_qn = qn(req.start_q); end_qn = qn(req.end_q)
+        quarters = []
+        for year in range(req.start_year, req.end_year + 1):
+            q_from = start_qn if year == req.start_year else 1
+            q_to   = end_qn   if year == req.end_year   else 4
+            quarters += [(year, f"Q{qi}") for qi in range(q_from, q_to + 1)]
+
+        # Each quarter gets its own page in the shared (authenticated)
+        # context; the semaphore bounds how many render at once.
+        quarter_sem = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+
+        async def scrape_quarter(year: int, qlabel: str):
+            async with quarter_sem:
+                qpage = await context.new_page()
+                try:
+                    await qpage.goto(company_url, wait_until="domcontentloaded")
+                    try:
+                        await qpage.locator("section, [class*='card']").first.wait_for(timeout=3000)
+                    except Exception:
+                        pass
 
-    browser = None
-    try:
-        with sync_playwright() as pw:
-            browser = pw.chromium.launch(
-                headless=True,
-                args=["--no-sandbox", "--disable-dev-shm-usage", "--disable-blink-features=AutomationControlled"],
-            )
-            page = browser.new_page()
-            page.set_default_timeout(PW_DEFAULT_TIMEOUT_MS)
-
-            logger.info("STEP 1: login")
-            login_keycloak(page, QUARTR_EMAIL, QUARTR_PASSWORD)
-            watchdog("login", page)
-
-            logger.info("STEP 2: open company")
-            open_company(page, req.ticker)
-            watchdog("open_company", page)
-
-            logger.info("STEP 3: iterate quarters and collect assets")
-            start_qn = qn(req.start_q); end_qn = qn(req.end_q)
-            collected = []
-            for year in range(req.start_year, req.end_year + 1):
-                q_from = start_qn if year == req.start_year else 1
-                q_to   = end_qn   if year == req.end_year   else 4
-
-                # Keep the page in a known state (company overview)
-                if "/company/" not in page.url:
-                    # best-effort: go back to company page
-                    page.goto(f"https://web.quartr.com/search?q={req.ticker}", wait_until="domcontentloaded")
-                    page.wait_for_load_state("networkidle")
-                    page.wait_for_timeout(200)
-
-                for qi in range(q_from, q_to + 1):
-                    qlabel = f"Q{qi}"
-                    _ensure_year_visible(page, year)
-                    ok = _open_event_card(page, year, qlabel)
-                    watchdog(f"open_event_{year}_{qlabel}", page)
+                    await _ensure_year_visible(qpage, year)
+                    ok = await _open_event_card(qpage, year, qlabel)
                     if not ok:
-                        _save_png(page, f"open_event_fail_{req.ticker}_{year}_{qlabel}")
-                        continue
+                        await _save_png(qpage, f"open_event_fail_{ticker}_{year}_{qlabel}")
+                        return None
 
-                    links = _collect_asset_links_from_event(page)
-                    logger.info(f"Assets for {req.ticker} {qlabel} {year}: {links}")
-                    collected.append({"ticker": req.ticker, "year": year, "quarter": qlabel, **links})
+                    links = await _collect_asset_links_from_event(qpage)
+                    logger.info(f"Assets for {ticker} {qlabel} {year}: {links}")
+                    return {"ticker": ticker, "year": year, "quarter": qlabel, **links}
+                finally:
+                    await qpage.close()
 
-                    # try to return to company overview after each event
-                    try:
-                        page.keyboard.press("Escape")
-                        page.wait_for_timeout(150)
-                    except Exception:
-                        pass
+        results = await asyncio.gather(*(scrape_quarter(y, q) for y, q in quarters))
+        collected = [r for r in results if r is not None]
 
-            return {"status": "ok", "ticker": req.ticker, "assets": collected}
+        return {"status": "ok", "ticker": ticker, "assets": collected}
 
     except HTTPException:
         raise
@@ -646,9 +1193,17 @@ def backfill(req: BackfillRequest):
         raise HTTPException(status_code=504, detail=f"Playwright timeout: {e}")
     except Exception as e:
         logger.exception("Backfill failed")
+        # Only relaunch when the browser itself is gone — application
+        # failures (unknown ticker, missed selector) must not tear down
+        # the warm Chromium that concurrent jobs are still scraping on.
+        if _browser is None or not _browser.is_connected():
+            await _reset_browser()
         raise HTTPException(status_code=500, detail=f"Backfill failed: {e}")
     finally:
         try:
-            if browser: browser.close()
+            if page:
+                await page.close()
         except Exception:
-            pass
\ No newline at end of file
+            pass
+        if context is not None:
+            await _release_context()